@@ -4,49 +4,105 @@ OpenTelemetry Demo Server - Python Version
 A simple HTTP server that generates various types of traces for testing
 """
 
-import json
+import functools
 import logging
+import queue
 import random
 import time
 from datetime import datetime
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from typing import Dict, Any
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, NamedTuple
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+import orjson
+
+# Configure logging. Request threads only render the message and enqueue the
+# record; the listener's background thread applies the full format and writes
+# to stderr. If the root logger is already configured (e.g. by
+# opentelemetry-instrument with OTEL_PYTHON_LOG_CORRELATION=true), its
+# handlers are moved behind the queue so their format is kept.
+root_logger = logging.getLogger()
+log_handlers = root_logger.handlers[:]
+if not log_handlers:
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    log_handlers = [log_handler]
+    root_logger.setLevel(logging.INFO)
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, *log_handlers)
+log_listener.start()
+queue_handler = QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
+root_logger.handlers = [queue_handler]
 logger = logging.getLogger(__name__)
 
 # Global start time for uptime calculation
-start_time = datetime.now()
+START_MONO = time.monotonic()
+
+# The root response never changes, so serialize it once at import time
+ROOT_BODY = orjson.dumps({
+    "status": "success",
+    "message": "OpenTelemetry Demo Server (Python)",
+    "data": {
+        "endpoints": ["/good", "/bad", "/admin", "/health"],
+        "version": "1.0.0"
+    }
+})
+# Prebuilt status line, headers and body for /. It has no Connection, Date or
+# Server header; keep-alive is decided by parse_request.
+ROOT_RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: %d\r\n"
+    b"\r\n" % len(ROOT_BODY)
+) + ROOT_BODY
+
+
+@functools.lru_cache(maxsize=1)
+def format_timestamp(second: int) -> str:
+    """Formats a Unix timestamp as ISO 8601, cached for the current second"""
+    return datetime.fromtimestamp(second).isoformat()
+
+
+def current_timestamp() -> str:
+    """Returns the current time as an ISO 8601 string"""
+    # Responses only need second precision, so every request within the same
+    # second shares one formatted string
+    return format_timestamp(int(time.time()))
 
 
-class User:
+class User(NamedTuple):
     """Represents a user in our system"""
-    def __init__(self, id: int, name: str):
-        self.id = id
-        self.name = name
-    
-    def to_dict(self):
-        return {"id": self.id, "name": self.name}
+    id: int
+    name: str
+
+
+# The demo user list is fixed, so build it and its JSON-ready form once
+USERS = [
+    User(1, "Alice Johnson"),
+    User(2, "Bob Smith"),
+    User(3, "Charlie Brown")
+]
+USERS_PAYLOAD = [user._asdict() for user in USERS]
 
 
 def simulate_database(operation: str) -> None:
     """Simulates a database call with random latency"""
     # Random latency between 10-100ms to make traces interesting
-    latency = random.randint(10, 100) / 1000  # Convert to seconds
-    logger.info(f"Database operation: {operation} (latency: {latency*1000:.0f}ms)")
+    latency = 0.010 + random.random() * 0.090  # In seconds
+    logger.info("Database operation: %s (latency: %.0fms)", operation, latency * 1000)
     time.sleep(latency)
 
 
 def simulate_external_api(endpoint: str) -> Dict[str, Any]:
     """Simulates calling an external API"""
-    logger.info(f"Calling external API: {endpoint}")
+    # No real request is made here. If this ever calls out for real, share one
+    # module-level pooled session (e.g. requests.Session) across calls rather
+    # than opening a new connection per request.
+    logger.info("Calling external API: %s", endpoint)
     
     # Simulate network latency
-    latency = random.randint(50, 250) / 1000  # Convert to seconds
+    latency = 0.050 + random.random() * 0.200  # 50-250ms, in seconds
     time.sleep(latency)
     
     # Simulate some data being returned
@@ -59,47 +115,59 @@ def simulate_external_api(endpoint: str) -> Dict[str, Any]:
 class RequestHandler(BaseHTTPRequestHandler):
     """HTTP request handler for the demo server"""
     
+    # Keep client connections open between requests. Every response must carry
+    # a Content-Length header: send_json_response and ROOT_RESPONSE set it, as
+    # does send_error.
+    protocol_version = "HTTP/1.1"
+    
+    # Close kept-alive connections that sit idle for this many seconds, so
+    # idle clients don't hold a handler thread forever
+    timeout = 30
+    
+    # Set TCP_NODELAY on accepted connections so small responses on a
+    # kept-alive connection aren't held back by Nagle's algorithm
+    disable_nagle_algorithm = True
+    
+    # Buffer wfile so headers and body leave in one send() when the request
+    # handling flushes, instead of a separate write for each
+    wbufsize = -1
+    
     def log_message(self, format, *args):
         """Override to use our logger"""
-        logger.info(f"{self.address_string()} - {format % args}")
+        logger.info("%s - " + format, self.address_string(), *args)
+    
+    def address_string(self):
+        """Return the client IP without any reverse DNS lookup"""
+        return self.client_address[0]
     
     def send_json_response(self, status_code: int, response: Dict[str, Any]):
         """Helper to send JSON responses"""
+        # orjson returns bytes directly, so there is no separate encode step
+        body = orjson.dumps(response)
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(response).encode('utf-8'))
+        self.wfile.write(body)
     
     def do_GET(self):
         """Handle GET requests"""
-        if self.path == '/':
-            self.handle_root()
-        elif self.path == '/good':
-            self.handle_good()
-        elif self.path == '/bad':
-            self.handle_bad()
-        elif self.path == '/admin':
-            self.handle_admin()
-        elif self.path == '/health':
-            self.handle_health()
+        handler = self.ROUTES.get(self.path)
+        if handler:
+            handler(self)
         else:
             self.send_error(404, "Not Found")
     
     def handle_root(self):
         """Root handler - returns service info"""
-        response = {
-            "status": "success",
-            "message": "OpenTelemetry Demo Server (Python)",
-            "data": {
-                "endpoints": ["/good", "/bad", "/admin", "/health"],
-                "version": "1.0.0"
-            }
-        }
-        self.send_json_response(200, response)
+        # Skip send_response's per-request header formatting and write the
+        # prebuilt response directly
+        self.log_request(200)
+        self.wfile.write(ROOT_RESPONSE)
     
     def handle_good(self):
         """Handle /good endpoint - successful request with various operations"""
-        logger.info(f"Processing good request from {self.address_string()}")
+        logger.info("Processing good request from %s", self.address_string())
         
         try:
             # Simulate some business logic with database calls
@@ -110,23 +178,16 @@ class RequestHandler(BaseHTTPRequestHandler):
             try:
                 external_data = simulate_external_api("https://api.example.com/status")
             except Exception as e:
-                logger.error(f"External API error: {e}")
+                logger.error("External API error: %s", e)
                 # Continue anyway for demo purposes
             
-            # Create some users data
-            users = [
-                User(1, "Alice Johnson"),
-                User(2, "Bob Smith"),
-                User(3, "Charlie Brown")
-            ]
-            
             response = {
                 "status": "success",
                 "message": "Request processed successfully",
                 "data": {
-                    "users": [user.to_dict() for user in users],
+                    "users": USERS_PAYLOAD,
                     "external_data": external_data,
-                    "processed_at": datetime.now().isoformat()
+                    "processed_at": current_timestamp()
                 }
             }
             
@@ -134,18 +195,18 @@ class RequestHandler(BaseHTTPRequestHandler):
             logger.info("Successfully processed good request")
             
         except Exception as e:
-            logger.error(f"Error processing good request: {e}")
+            logger.error("Error processing good request: %s", e)
             self.send_error(503, "Service Unavailable")
     
     def handle_bad(self):
         """Handle /bad endpoint - returns 500 error after some processing"""
-        logger.info(f"Processing bad request from {self.address_string()}")
+        logger.info("Processing bad request from %s", self.address_string())
         
         # Simulate some processing that leads to an error
         try:
             simulate_database("SELECT * FROM non_existent_table")
         except Exception as e:
-            logger.info(f"Expected database error: {e}")
+            logger.info("Expected database error: %s", e)
         
         # Simulate multiple failed operations
         operations = [
@@ -154,23 +215,26 @@ class RequestHandler(BaseHTTPRequestHandler):
             "process_payment"
         ]
         
+        # Add some artificial delay to make traces more interesting, drawn per
+        # operation but slept in one go
+        delay = 0.0
         for op in operations:
-            logger.info(f"Operation failed: {op}")
-            # Add some artificial delay to make traces more interesting
-            time.sleep(random.randint(5, 25) / 1000)
+            logger.info("Operation failed: %s", op)
+            delay += 0.005 + random.random() * 0.020
+        time.sleep(delay)
         
         # Try external API call that will "fail"
         try:
             simulate_external_api("https://api.example.com/broken-endpoint")
         except Exception as e:
-            logger.info(f"External API call failed as expected: {e}")
+            logger.info("External API call failed as expected: %s", e)
         
         response = {
             "status": "error",
             "message": "Internal server error occurred",
             "data": {
                 "error_code": "INTERNAL_ERROR",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": current_timestamp()
             }
         }
         
@@ -179,17 +243,17 @@ class RequestHandler(BaseHTTPRequestHandler):
     
     def handle_admin(self):
         """Handle /admin endpoint - returns 401 unauthorized"""
-        logger.info(f"Admin access attempted from {self.address_string()}")
+        logger.info("Admin access attempted from %s", self.address_string())
         
         # Simulate authentication check
         auth_token = self.headers.get('Authorization', '')
-        logger.info(f"Checking authorization token: {auth_token}")
+        logger.info("Checking authorization token: %s", auth_token)
         
         # Simulate database call to check permissions
         try:
             simulate_database("SELECT permissions FROM users WHERE token=?")
         except Exception as e:
-            logger.error(f"Auth database error: {e}")
+            logger.error("Auth database error: %s", e)
         
         # Simulate permission validation logic
         operations = [
@@ -198,9 +262,11 @@ class RequestHandler(BaseHTTPRequestHandler):
             "verify_admin_permissions"
         ]
         
+        delay = 0.0
         for op in operations:
-            logger.info(f"Auth operation: {op}")
-            time.sleep(random.randint(5, 20) / 1000)
+            logger.info("Auth operation: %s", op)
+            delay += 0.005 + random.random() * 0.015
+        time.sleep(delay)
         
         # Always return unauthorized for demo purposes
         logger.info("Authorization failed - insufficient permissions")
@@ -211,7 +277,7 @@ class RequestHandler(BaseHTTPRequestHandler):
             "data": {
                 "error_code": "UNAUTHORIZED",
                 "required_role": "admin",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": current_timestamp()
             }
         }
         
@@ -220,27 +286,46 @@ class RequestHandler(BaseHTTPRequestHandler):
     
     def handle_health(self):
         """Handle /health endpoint - health check"""
-        logger.info(f"Health check from {self.address_string()}")
+        logger.info("Health check from %s", self.address_string())
         
-        uptime = datetime.now() - start_time
+        secs = int(time.monotonic() - START_MONO)
+        uptime = f"{secs // 3600}:{secs // 60 % 60:02d}:{secs % 60:02d}"
         response = {
             "status": "healthy",
             "message": "Service is running",
             "data": {
-                "uptime": str(uptime),
-                "timestamp": datetime.now().isoformat()
+                "uptime": uptime,
+                "timestamp": current_timestamp()
             }
         }
         
         self.send_json_response(200, response)
+    
+    # Path to handler lookup used by do_GET
+    ROUTES = {
+        '/': handle_root,
+        '/good': handle_good,
+        '/bad': handle_bad,
+        '/admin': handle_admin,
+        '/health': handle_health,
+    }
+
+
+class DemoHTTPServer(ThreadingHTTPServer):
+    """Threaded HTTP server tuned for bursts of short requests"""
+    
+    # Larger listen backlog so connection bursts aren't dropped
+    request_queue_size = 256
 
 
 def run_server(port: int = 8080):
     """Run the HTTP server"""
     server_address = ('', port)
-    httpd = HTTPServer(server_address, RequestHandler)
+    # Handle each connection on its own thread so simulated latency in one
+    # client's request doesn't hold up the others
+    httpd = DemoHTTPServer(server_address, RequestHandler)
     
-    logger.info(f"Starting server on port {port}")
+    logger.info("Starting server on port %d", port)
     logger.info("Available endpoints:")
     logger.info("  GET /        - Service info")
     logger.info("  GET /good    - Returns 200 with success response")
@@ -253,6 +338,9 @@ def run_server(port: int = 8080):
     except KeyboardInterrupt:
         logger.info("Server shutting down...")
         httpd.shutdown()
+    finally:
+        # Flush any queued log records before exiting
+        log_listener.stop()
 
 
 if __name__ == "__main__":